@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for the document converter.
+Worker counts and timeout can be overridden through environment variables.
+"""
+
+import os
+
+bind = '0.0.0.0:8180'
+
+# Threads handle uploads and responses; CPU-bound conversion runs in each
+# worker's process pool (see server.py)
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '300'))
+
+# Split the CPUs between the workers' conversion pools instead of giving
+# every worker a pool as large as the machine
+os.environ.setdefault(
+    'CONVERSION_WORKERS', str(max(1, (os.cpu_count() or 1) // workers))
+)
+
+# Import the app once in the master so workers share it copy-on-write
+preload_app = True
@@ -6,15 +6,323 @@ Provides MuPDF-based PDF conversion and metadata extraction endpoints.
 import os
 import tempfile
 import logging
-from flask import Flask, request, jsonify, send_file, after_this_request
-from functools import wraps
+import hashlib
+import multiprocessing
+import shutil
+import threading
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import fitz  # PyMuPDF
+import orjson
+import pymupdf4llm
+from flask import Flask, Request, Response, request, jsonify
+from flask.json.provider import JSONProvider
+from functools import partial, wraps
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson; Markdown payloads can be several MB"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round trip of the default response()
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
+
+class UploadRequest(Request):
+    """Request that spools large multipart file parts into scratch files"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is None or total_content_length > SPOOL_MAX_MEMORY:
+            # A named scratch file lets write_temp_pdf() hard-link the
+            # spooled upload instead of copying it
+            return tempfile.NamedTemporaryFile(
+                'rb+', prefix=SPOOL_PREFIX, suffix='.pdf', dir=scratch_dir_for(total_content_length)
+            )
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
 
 app = Flask(__name__)
-logging.basicConfig(level=logging.INFO)
+app.json = OrjsonProvider(app)
+app.request_class = UploadRequest
+# Werkzeug stops reading request bodies past this size
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', '200')) * 1024 * 1024
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 API_KEY = os.environ.get('DOCUMENT_CONVERTER_API_KEY', 'converter_secret_key')
 
+# Raw request bodies are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+RAW_UPLOAD_MIMETYPES = ('application/pdf', 'application/octet-stream')
+# Multipart file parts larger than this are spooled to a file (same
+# threshold as Werkzeug's default)
+SPOOL_MAX_MEMORY = 500 * 1024
+SPOOL_PREFIX = 'spool-'
+# Uploads up to this size are handed to PyMuPDF from memory instead of a
+# temp file
+MAX_IN_MEMORY = int(os.environ.get('MAX_IN_MEMORY_MB', '64')) * 1024 * 1024
+PDF_EXTENSION = '.pdf'
+
+# Fields served by /extract-metadata, in response order. All but pageCount
+# are keys of PyMuPDF's doc.metadata.
+METADATA_FIELDS = (
+    'title', 'author', 'subject', 'keywords', 'creator', 'producer',
+    'creationDate', 'modDate', 'pageCount', 'format',
+)
+
+# Conversion results are cached on disk keyed by the SHA-256 of the PDF bytes
+CACHE_DIR = os.environ.get(
+    'CONVERSION_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'document-converter-cache'),
+)
+HASH_CHUNK_SIZE = 64 * 1024
+
+# After every write the least recently used entries are deleted until the
+# cache directory fits into CACHE_MAX_MB again
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_MB', '1024')) * 1024 * 1024
+# Abandoned partial writes (e.g. of a killed worker) are deleted after this
+STALE_TMP_SECONDS = 3600
+
+# Recently read cache entries are also kept in memory, up to MEMORY_CACHE_MB
+# per gunicorn worker
+MEMORY_CACHE_MAX_BYTES = int(os.environ.get('MEMORY_CACHE_MB', '16')) * 1024 * 1024
+_memory_cache = OrderedDict()
+_memory_cache_bytes = 0
+_memory_cache_lock = threading.Lock()
+
+# Uploads and rendered thumbnails are short-lived, so keep them on tmpfs
+# (/dev/shm) when available instead of the container's disk-backed /tmp.
+# Files that don't fit into the free space left there (or of unknown size)
+# go to the disk-backed temp dir instead, see scratch_dir_for().
+SCRATCH_DIR = os.environ.get(
+    'SCRATCH_DIR',
+    '/dev/shm/document-converter' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+)
+os.makedirs(SCRATCH_DIR, exist_ok=True)
+
+# CPU-bound PDF work runs in separate processes so request threads stay free
+# for uploads and responses. Every task gets its own process from the fork
+# server, so a task that overruns CONVERSION_TIMEOUT can be killed without
+# touching the others; at most CONVERSION_WORKERS of them run at once. The
+# thread pool dispatching them is created lazily so that every gunicorn
+# worker owns its own after fork; all requests of a worker share it.
+_conversion_pool = None
+_conversion_pool_lock = threading.Lock()
+CONVERSION_WORKERS = int(os.environ.get('CONVERSION_WORKERS', os.cpu_count() or 1))
+
+# Forking a multi-threaded gunicorn worker is unsafe, so conversion processes
+# are forked from a fork server instead. It imports this module (and with it
+# pymupdf4llm and its layout model) once, so conversion processes start warm
+# and share it copy-on-write instead of importing it for every task.
+_process_context = multiprocessing.get_context('forkserver')
+_process_context.set_forkserver_preload([__name__])
+
+# Upper bound for the run time of a single conversion process, so
+# pathological PDFs can't hold a slot forever. Time spent waiting for a free
+# slot doesn't count.
+CONVERSION_TIMEOUT = int(os.environ.get('CONVERSION_TIMEOUT', '120'))
+
+# When set, /convert-mupdf splits PDFs into ranges of this many pages that
+# are converted in parallel. Off by default, because the output differs from
+# a whole-document conversion: pymupdf4llm derives heading levels from the
+# font sizes of the pages it converts together, so e.g. "## Chapter 11" can
+# become "# Chapter 11". Split results are cached under their own suffix.
+PARALLEL_PAGE_RANGE = int(os.environ.get('PARALLEL_PAGE_RANGE', '0'))
+WHOLE_DOCUMENT_CACHE_SUFFIX = '.md'
+MARKDOWN_CACHE_SUFFIX = (
+    f'.p{PARALLEL_PAGE_RANGE}.md' if PARALLEL_PAGE_RANGE else WHOLE_DOCUMENT_CACHE_SUFFIX
+)
+
+
+class ConversionTimeout(Exception):
+    """A conversion process ran longer than CONVERSION_TIMEOUT"""
+
+
+def get_conversion_pool():
+    """Return the thread pool that dispatches conversion processes"""
+    global _conversion_pool
+    with _conversion_pool_lock:
+        if _conversion_pool is None:
+            _conversion_pool = ThreadPoolExecutor(
+                max_workers=CONVERSION_WORKERS,
+                thread_name_prefix='conversion',
+            )
+        return _conversion_pool
+
+
+def _run_task(conn, fn, args):
+    """Entry point of a conversion process: send back fn(*args) or its error"""
+    try:
+        outcome = (True, fn(*args))
+    except Exception as e:
+        outcome = (False, e)
+    try:
+        conn.send(outcome)
+    except Exception as e:
+        # The result or the exception couldn't be pickled
+        conn.send((False, RuntimeError(str(e))))
+    conn.close()
+
+
+def run_in_process(fn, *args):
+    """
+    Run fn(*args) in a new conversion process and return its result.
+
+    The process is killed if it hasn't answered after CONVERSION_TIMEOUT
+    seconds, and ConversionTimeout is raised.
+    """
+    receiver, sender = _process_context.Pipe(duplex=False)
+    process = _process_context.Process(target=_run_task, args=(sender, fn, args), daemon=True)
+    try:
+        try:
+            process.start()
+        finally:
+            sender.close()
+        if not receiver.poll(CONVERSION_TIMEOUT):
+            logger.error("Conversion task timed out after %d seconds", CONVERSION_TIMEOUT)
+            process.kill()
+            raise ConversionTimeout(f'Conversion task timed out after {CONVERSION_TIMEOUT} seconds')
+        try:
+            succeeded, value = receiver.recv()
+        except EOFError:
+            # Wait for the exit code, which is negative for a killing signal
+            process.join()
+            raise RuntimeError(
+                f'Conversion process exited unexpectedly with code {process.exitcode}'
+            ) from None
+    finally:
+        receiver.close()
+        if process.pid is not None:
+            process.join()
+    if not succeeded:
+        raise value
+    return value
+
+
+def submit_to_pool(fn, *args):
+    """Schedule fn(*args) to run in a conversion process; returns a Future"""
+    return get_conversion_pool().submit(run_in_process, fn, *args)
+
+
+def run_in_pool(fn, *args):
+    """Run fn(*args) in a conversion process once a slot is free"""
+    return submit_to_pool(fn, *args).result()
+
+
+def open_pdf(source):
+    """Open a PDF given either its file path or its bytes"""
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype='pdf')
+    return fitz.open(source)
+
+
+def pdf_to_markdown(source, pages=None):
+    """Convert (some pages of) a PDF to Markdown (runs inside the conversion pool)"""
+    with open_pdf(source) as doc:
+        return pymupdf4llm.to_markdown(doc, pages=pages)
+
+
+def pdf_page_count(source):
+    """Count the pages of a PDF (runs inside the conversion pool)"""
+    with open_pdf(source) as doc:
+        return doc.page_count
+
+
+def convert_to_markdown(source):
+    """
+    Convert a PDF to Markdown in the conversion pool.
+
+    With PARALLEL_PAGE_RANGE set, the document is split into page ranges
+    that are converted in parallel; the partial results are joined in page
+    order.
+    """
+    if not PARALLEL_PAGE_RANGE:
+        return run_in_pool(pdf_to_markdown, source)
+
+    if isinstance(source, bytes):
+        # Hand the page range tasks a file instead of a copy of the bytes each
+        with tempfile.NamedTemporaryFile(suffix='.pdf', dir=scratch_dir_for(len(source)), delete=False) as tmp_input:
+            tmp_input.write(source)
+        try:
+            return convert_to_markdown(tmp_input.name)
+        finally:
+            os.unlink(tmp_input.name)
+
+    input_path = source
+
+    page_count = run_in_pool(pdf_page_count, input_path)
+    futures = [
+        submit_to_pool(
+            pdf_to_markdown,
+            input_path,
+            list(range(start, min(start + PARALLEL_PAGE_RANGE, page_count))),
+        )
+        for start in range(0, page_count, PARALLEL_PAGE_RANGE)
+    ]
+    return ''.join(future.result() for future in futures)
+
+
+def iter_markdown_pages(input_path, page_count):
+    """
+    Yield the Markdown of every page in order, converting pages in the
+    conversion pool with at most one page in flight per pool process.
+    """
+    in_flight = deque()
+    next_page = 0
+    try:
+        while next_page < page_count or in_flight:
+            while next_page < page_count and len(in_flight) < CONVERSION_WORKERS:
+                in_flight.append(submit_to_pool(pdf_to_markdown, input_path, [next_page]))
+                next_page += 1
+            yield in_flight.popleft().result()
+    finally:
+        # The client may disconnect mid-stream
+        for future in in_flight:
+            future.cancel()
+
+
+def read_pdf_metadata(source, fields=METADATA_FIELDS):
+    """
+    Read the given metadata fields of a PDF (runs inside the conversion pool).
+
+    The Info dictionary fields come from a single doc.metadata lookup; the
+    page tree is only consulted when pageCount is requested.
+    """
+    doc = open_pdf(source)
+
+    pdf_metadata = doc.metadata or {}
+    metadata = {
+        field: doc.page_count if field == 'pageCount' else pdf_metadata.get(field, '')
+        for field in fields
+    }
+
+    doc.close()
+    return metadata
+
+
+def render_thumbnail(source):
+    """Render the first PDF page to PNG bytes (runs inside the conversion pool)"""
+    doc = open_pdf(source)
+    page = doc.load_page(0)
+
+    zoom = 0.5
+    matrix = fitz.Matrix(zoom, zoom)
+    pix = page.get_pixmap(matrix=matrix, alpha=False)
+
+    doc.close()
+
+    return pix.tobytes('png')
+
 
 def require_api_key(f):
     """Decorator to require X-API-Key header"""
@@ -27,6 +335,369 @@ def require_api_key(f):
     return decorated
 
 
+def is_pdf_filename(filename):
+    """Case-insensitive check for a .pdf extension"""
+    # Only lower-case the extension, not the whole (possibly long) name
+    return filename[-len(PDF_EXTENSION):].lower() == PDF_EXTENSION
+
+
+def check_pdf_filename(filename):
+    """Return an error message if filename isn't an acceptable PDF name"""
+    if not filename:
+        return 'No file selected'
+    if not is_pdf_filename(filename):
+        return 'Only PDF files are supported'
+    return None
+
+
+def scratch_dir_for(size):
+    """Directory for a scratch file of the given size (None if unknown)"""
+    if size is not None:
+        try:
+            if size < shutil.disk_usage(SCRATCH_DIR).free:
+                return SCRATCH_DIR
+        except OSError:
+            pass
+    return tempfile.gettempdir()
+
+
+def link_spooled_upload(file):
+    """
+    Give a multipart upload spooled by UploadRequest a second name, so it
+    survives the request without being copied. Returns the new path, or None
+    if the upload isn't spooled to a named file.
+    """
+    spool_path = getattr(file.stream, 'name', None)
+    if not isinstance(spool_path, str) or not os.path.basename(spool_path).startswith(SPOOL_PREFIX):
+        return None
+
+    file.stream.flush()
+    input_path = os.path.join(
+        os.path.dirname(spool_path),
+        os.path.basename(spool_path)[len(SPOOL_PREFIX):],
+    )
+    try:
+        os.link(spool_path, input_path)
+    except OSError:
+        return None
+    return input_path
+
+
+def write_temp_pdf(file=None, stream=None):
+    """Write an uploaded FileStorage or a raw body stream to a temp file"""
+    if file is not None:
+        input_path = link_spooled_upload(file)
+        if input_path:
+            return input_path
+
+    # The request's length bounds the size of any file in it
+    scratch_dir = scratch_dir_for(request.content_length)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', dir=scratch_dir, delete=False) as tmp_input:
+        try:
+            if file is not None:
+                file.stream.seek(0)
+                shutil.copyfileobj(file.stream, tmp_input, UPLOAD_CHUNK_SIZE)
+            else:
+                while True:
+                    chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    tmp_input.write(chunk)
+        except Exception:
+            # Don't leave partial uploads behind
+            tmp_input.close()
+            os.unlink(tmp_input.name)
+            raise
+
+    return tmp_input.name
+
+
+def get_upload():
+    """
+    Find the uploaded PDF in the request.
+
+    Accepts either multipart/form-data with a `file` field, or a raw
+    application/pdf (or application/octet-stream) body with the filename in
+    the X-Filename header.
+
+    Returns (filename, file, None) on success, where file is None for raw
+    bodies, and (None, None, error_response) otherwise.
+    """
+    if request.mimetype in RAW_UPLOAD_MIMETYPES:
+        file = None
+        filename = request.headers.get('X-Filename', '')
+    else:
+        try:
+            file = request.files.get('file')
+        except RequestEntityTooLarge as e:
+            # Bodies without Content-Length are only caught while parsing
+            return None, None, upload_too_large(e)
+        if file is None:
+            return None, None, (jsonify({'error': 'No file provided'}), 400)
+        filename = file.filename
+
+    error = check_pdf_filename(filename)
+    if error:
+        return None, None, (jsonify({'error': error}), 400)
+
+    return filename, file, None
+
+
+def save_upload():
+    """
+    Save the uploaded PDF to a temp file.
+
+    Raw bodies are streamed straight to disk without going through the
+    multipart parser.
+
+    Returns (filename, input_path, None) on success and
+    (None, None, error_response) otherwise.
+    """
+    filename, file, error = get_upload()
+    if error:
+        return None, None, error
+
+    if file is not None:
+        return filename, write_temp_pdf(file=file), None
+    try:
+        return filename, write_temp_pdf(stream=request.stream), None
+    except RequestEntityTooLarge as e:
+        return None, None, upload_too_large(e)
+
+
+def load_upload():
+    """
+    Load the uploaded PDF for processing.
+
+    Uploads up to MAX_IN_MEMORY bytes are read into memory, so PyMuPDF can
+    open them without a round trip through a temp file; larger ones (or ones
+    of unknown size) are saved to a temp file.
+
+    Returns (filename, source, None) on success, where source is either the
+    PDF's bytes or a temp file path to be removed with discard_source(), and
+    (None, None, error_response) otherwise.
+    """
+    if request.content_length is None or request.content_length > MAX_IN_MEMORY:
+        return save_upload()
+
+    filename, file, error = get_upload()
+    if error:
+        return None, None, error
+
+    if file is not None:
+        return filename, file.read(), None
+    return filename, request.stream.read(), None
+
+
+def discard_source(source):
+    """Remove the temp file behind an upload source, if there is one"""
+    if isinstance(source, str) and os.path.exists(source):
+        os.unlink(source)
+
+
+def source_sha256(source):
+    """Return the hex SHA-256 digest of a PDF given as bytes or file path"""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def use_cache():
+    """Whether the request allows cached results (disable with ?cache=0)"""
+    return request.args.get('cache') != '0'
+
+
+def cache_path(digest, suffix):
+    return os.path.join(CACHE_DIR, digest + suffix)
+
+
+def remember_cached(key, text):
+    """Keep a cache entry in memory, evicting the least recently used ones"""
+    global _memory_cache_bytes
+    size = sys.getsizeof(text)
+    if size > MEMORY_CACHE_MAX_BYTES:
+        return
+    with _memory_cache_lock:
+        previous = _memory_cache.pop(key, None)
+        if previous is not None:
+            _memory_cache_bytes -= sys.getsizeof(previous)
+        _memory_cache[key] = text
+        _memory_cache_bytes += size
+        while _memory_cache_bytes > MEMORY_CACHE_MAX_BYTES:
+            _, evicted = _memory_cache.popitem(last=False)
+            _memory_cache_bytes -= sys.getsizeof(evicted)
+
+
+def read_cached(digest, suffix):
+    """Return a cached conversion result, or None on a cache miss"""
+    key = digest + suffix
+    path = cache_path(digest, suffix)
+    with _memory_cache_lock:
+        text = _memory_cache.get(key)
+        if text is not None:
+            _memory_cache.move_to_end(key)
+    if text is not None:
+        # Other workers rely on the disk entry, so keep it from aging
+        touch_cached(path)
+        return text
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    touch_cached(path)
+    remember_cached(key, text)
+    return text
+
+
+def touch_cached(path):
+    """Mark a disk cache entry as recently used; prune_cache goes by mtime"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache():
+    """Delete the least recently used cache entries beyond CACHE_MAX_BYTES"""
+    entries = []
+    total_size = 0
+    stale_before = time.time() - STALE_TMP_SECONDS
+    try:
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith('.tmp'):
+                    # Partial writes are left alone unless abandoned
+                    if stat.st_mtime < stale_before:
+                        delete_quietly(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+    except OSError as e:
+        logger.warning("Could not prune conversion cache: %s", e)
+        return
+
+    entries.sort()
+    for mtime, size, path in entries:
+        if total_size <= CACHE_MAX_BYTES:
+            break
+        delete_quietly(path)
+        total_size -= size
+
+
+def delete_quietly(path):
+    """Delete a cache file; another worker may have pruned it already"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("Could not prune conversion cache: %s", e)
+
+
+def write_cached(digest, suffix, text):
+    """Atomically store a conversion result in the cache"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, cache_path(digest, suffix))
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        # A failing cache must never fail the conversion itself
+        logger.warning("Could not write conversion cache: %s", e)
+    else:
+        prune_cache()
+
+
+def tee_to_cache(digest, suffix, chunks):
+    """
+    Yield chunks unchanged while writing them to the cache. The entry only
+    becomes visible once all chunks were written; a failing cache never
+    interrupts the chunks.
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        cache_file = os.fdopen(fd, 'w', encoding='utf-8')
+    except OSError as e:
+        logger.warning("Could not write conversion cache: %s", e)
+        yield from chunks
+        return
+
+    # Only the cache file operations are guarded; errors raised by the
+    # chunks themselves (e.g. a conversion timeout) must reach the caller
+    try:
+        for chunk in chunks:
+            if cache_file is not None:
+                try:
+                    cache_file.write(chunk)
+                except OSError as e:
+                    logger.warning("Could not write conversion cache: %s", e)
+                    close_quietly(cache_file)
+                    cache_file = None
+            yield chunk
+
+        if cache_file is not None:
+            try:
+                cache_file.close()
+                os.replace(tmp_path, cache_path(digest, suffix))
+            except OSError as e:
+                logger.warning("Could not write conversion cache: %s", e)
+            else:
+                prune_cache()
+            cache_file = None
+    finally:
+        if cache_file is not None:
+            close_quietly(cache_file)
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def close_quietly(file):
+    """Close a file whose contents are being discarded anyway"""
+    try:
+        file.close()
+    except OSError:
+        pass
+
+
+def iter_text_chunks(text, size=HASH_CHUNK_SIZE):
+    """Split text into chunks for streaming"""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+@app.before_request
+def reject_oversized_upload():
+    """Reject uploads with a too large Content-Length before reading them"""
+    if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        raise RequestEntityTooLarge()
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'File too large (limit is {limit_mb} MB)'}), 413
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -41,49 +712,182 @@ def convert_pdf_mupdf():
     
     Expects multipart/form-data with:
     - file: PDF file
+    or a raw application/pdf body with an X-Filename header
     
     Returns:
     - markdown: The converted markdown text
     """
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
+    source = None
+    try:
+        filename, source, error = load_upload()
+        if error:
+            return error
+        
+        logger.info("Processing PDF with MuPDF: %s", filename)
+        
+        digest = source_sha256(source) if use_cache() else None
+        markdown_text = read_cached(digest, MARKDOWN_CACHE_SUFFIX) if digest else None
+        
+        if markdown_text is None:
+            markdown_text = convert_to_markdown(source)
+            if digest:
+                write_cached(digest, MARKDOWN_CACHE_SUFFIX, markdown_text)
+        else:
+            logger.info("Using cached Markdown for %s", filename)
+        
+        logger.info("Successfully converted %s with MuPDF", filename)
+        
+        return jsonify({
+            'success': True,
+            'markdown': markdown_text,
+            'filename': filename
+        })
+        
+    except ConversionTimeout:
+        return jsonify({'error': 'Conversion timed out'}), 504
+        
+    except Exception as e:
+        logger.error("Error converting PDF with MuPDF: %s", e)
+        return jsonify({'error': str(e)}), 500
+        
+    finally:
+        discard_source(source)
+
+
+@app.route('/convert-mupdf-stream', methods=['POST'])
+@require_api_key
+def convert_pdf_mupdf_stream():
+    """
+    Convert PDF to Markdown using pymupdf4llm, streaming the result
     
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+    Accepts the same uploads as /convert-mupdf.
     
-    if not file.filename.lower().endswith('.pdf'):
-        return jsonify({'error': 'Only PDF files are supported'}), 400
+    Every page is converted on its own, so headings may be leveled
+    differently than by /convert-mupdf.
     
+    Returns:
+    - text/markdown response body, sent page by page as pages are converted
+    """
+    input_path = None
     try:
         # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_input:
-            file.save(tmp_input.name)
-            input_path = tmp_input.name
+        filename, input_path, error = save_upload()
+        if error:
+            return error
         
-        logger.info(f"Processing PDF with MuPDF: {file.filename}")
+        logger.info("Streaming PDF with MuPDF: %s", filename)
         
-        import pymupdf4llm
+        # Pages converted one at a time can come out slightly different from
+        # a whole-document conversion (e.g. heading levels, which pymupdf4llm
+        # derives from the font sizes of all converted pages), so the streamed
+        # result has a cache entry of its own
+        digest = source_sha256(input_path) if use_cache() else None
+        markdown_text = read_cached(digest, '.pages.md') if digest else None
         
-        markdown_text = pymupdf4llm.to_markdown(input_path)
+        if markdown_text is None:
+            page_count = run_in_pool(pdf_page_count, input_path)
+            chunks = iter_markdown_pages(input_path, page_count)
+            if digest:
+                chunks = tee_to_cache(digest, '.pages.md', chunks)
+        else:
+            logger.info("Using cached Markdown for %s", filename)
+            chunks = iter_text_chunks(markdown_text)
         
-        # Clean up temp file
-        os.unlink(input_path)
+        # The upload is needed until the response was sent
+        response = Response(chunks, mimetype='text/markdown')
+        response.call_on_close(partial(discard_source, input_path))
+        input_path = None
+        return response
         
-        logger.info(f"Successfully converted {file.filename} with MuPDF")
+    except ConversionTimeout:
+        return jsonify({'error': 'Conversion timed out'}), 504
+        
+    except Exception as e:
+        logger.error("Error streaming PDF with MuPDF: %s", e)
+        return jsonify({'error': str(e)}), 500
+        
+    finally:
+        discard_source(input_path)
+
+
+@app.route('/convert-batch', methods=['POST'])
+@require_api_key
+def convert_pdf_batch():
+    """
+    Convert several PDFs to Markdown using pymupdf4llm in one request
+    
+    Expects multipart/form-data with:
+    - files: PDF files (repeat the field once per document)
+    
+    Documents are converted concurrently on the conversion pool, each as a
+    whole: PARALLEL_PAGE_RANGE doesn't apply here, so with it set the
+    Markdown can differ from /convert-mupdf's for the same PDF.
+    
+    Returns:
+    - results: One {filename, success, markdown | error} object per file,
+               in upload order
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    
+    logger.info("Processing batch of %d PDFs with MuPDF", len(files))
+    
+    results = []
+    pending = []
+    input_paths = []
+    try:
+        for file in files:
+            result = {'filename': file.filename}
+            results.append(result)
+            
+            error = check_pdf_filename(file.filename)
+            if error:
+                result.update(success=False, error=error)
+                continue
+            
+            input_path = write_temp_pdf(file=file)
+            input_paths.append(input_path)
+            
+            digest = source_sha256(input_path) if use_cache() else None
+            markdown_text = read_cached(digest, WHOLE_DOCUMENT_CACHE_SUFFIX) if digest else None
+            if markdown_text is not None:
+                result.update(success=True, markdown=markdown_text)
+                continue
+            
+            future = submit_to_pool(pdf_to_markdown, input_path)
+            pending.append((result, digest, future))
+        
+        for result, digest, future in pending:
+            try:
+                markdown_text = future.result()
+            except ConversionTimeout:
+                result.update(success=False, error='Conversion timed out')
+                continue
+            except Exception as e:
+                logger.error("Error converting %s with MuPDF: %s", result['filename'], e)
+                result.update(success=False, error=str(e))
+                continue
+            if digest:
+                write_cached(digest, WHOLE_DOCUMENT_CACHE_SUFFIX, markdown_text)
+            result.update(success=True, markdown=markdown_text)
+        
+        logger.info("Successfully processed batch of %d PDFs with MuPDF", len(files))
         
         return jsonify({
             'success': True,
-            'markdown': markdown_text,
-            'filename': file.filename
+            'results': results
         })
         
     except Exception as e:
-        logger.error(f"Error converting PDF with MuPDF: {str(e)}")
-        # Clean up on error
-        if 'input_path' in locals() and os.path.exists(input_path):
-            os.unlink(input_path)
+        logger.error("Error converting PDF batch with MuPDF: %s", e)
         return jsonify({'error': str(e)}), 500
+        
+    finally:
+        # Clean up temp files
+        for input_path in input_paths:
+            if os.path.exists(input_path):
+                os.unlink(input_path)
 
 
 @app.route('/extract-metadata', methods=['POST'])
@@ -95,6 +899,8 @@ def extract_pdf_metadata():
     Expects multipart/form-data with:
     - file: PDF file
     - fields (optional): JSON array of fields to extract
+    or a raw application/pdf body with an X-Filename header and `fields`
+    passed as query parameter
     
     Available fields: title, author, subject, keywords, creator, producer, 
                       creationDate, modDate, pageCount, format
@@ -102,78 +908,60 @@ def extract_pdf_metadata():
     Returns:
     - metadata: Object with requested metadata fields
     """
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
-    if not file.filename.lower().endswith('.pdf'):
-        return jsonify({'error': 'Only PDF files are supported'}), 400
-    
     # Get requested fields (default to all)
-    requested_fields = request.form.get('fields')
+    requested_fields = request.values.get('fields')
     if requested_fields:
         try:
-            import json
-            requested_fields = json.loads(requested_fields)
-        except:
+            requested_fields = orjson.loads(requested_fields)
+        except ValueError:
             requested_fields = None
     
+    if requested_fields and isinstance(requested_fields, list):
+        requested = {field for field in requested_fields if isinstance(field, str)}
+        fields = tuple(field for field in METADATA_FIELDS if field in requested)
+    else:
+        fields = METADATA_FIELDS
+    
+    source = None
     try:
-        # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_input:
-            file.save(tmp_input.name)
-            input_path = tmp_input.name
-        
-        logger.info(f"Extracting metadata from PDF: {file.filename}")
-        
-        import fitz  # PyMuPDF
-        
-        doc = fitz.open(input_path)
+        filename, source, error = load_upload()
+        if error:
+            return error
         
-        # Get all available metadata
-        pdf_metadata = doc.metadata or {}
+        logger.info("Extracting metadata from PDF: %s", filename)
         
-        all_metadata = {
-            'title': pdf_metadata.get('title', ''),
-            'author': pdf_metadata.get('author', ''),
-            'subject': pdf_metadata.get('subject', ''),
-            'keywords': pdf_metadata.get('keywords', ''),
-            'creator': pdf_metadata.get('creator', ''),
-            'producer': pdf_metadata.get('producer', ''),
-            'creationDate': pdf_metadata.get('creationDate', ''),
-            'modDate': pdf_metadata.get('modDate', ''),
-            'pageCount': doc.page_count,
-            'format': pdf_metadata.get('format', ''),
-        }
+        digest = source_sha256(source) if use_cache() else None
+        cached_metadata = read_cached(digest, '.metadata.json') if digest else None
         
-        doc.close()
-        
-        # Filter to requested fields if specified
-        if requested_fields and isinstance(requested_fields, list):
-            metadata = {k: v for k, v in all_metadata.items() if k in requested_fields}
+        if cached_metadata is not None:
+            logger.info("Using cached metadata for %s", filename)
+            all_metadata = orjson.loads(cached_metadata)
+            metadata = {field: all_metadata[field] for field in fields}
+        elif digest:
+            # Cache entries always hold every field
+            all_metadata = run_in_pool(read_pdf_metadata, source)
+            write_cached(digest, '.metadata.json', orjson.dumps(all_metadata).decode())
+            metadata = {field: all_metadata[field] for field in fields}
         else:
-            metadata = all_metadata
-        
-        # Clean up temp file
-        os.unlink(input_path)
+            metadata = run_in_pool(read_pdf_metadata, source, fields)
         
-        logger.info(f"Successfully extracted metadata from {file.filename}")
+        logger.info("Successfully extracted metadata from %s", filename)
         
         return jsonify({
             'success': True,
             'metadata': metadata,
-            'filename': file.filename
+            'filename': filename
         })
         
+    except ConversionTimeout:
+        return jsonify({'error': 'Conversion timed out'}), 504
+        
     except Exception as e:
-        logger.error(f"Error extracting PDF metadata: {str(e)}")
-        # Clean up on error
-        if 'input_path' in locals() and os.path.exists(input_path):
-            os.unlink(input_path)
+        logger.error("Error extracting PDF metadata: %s", e)
         return jsonify({'error': str(e)}), 500
+        
+    finally:
+        discard_source(source)
 
 
 @app.route('/generate-thumbnail', methods=['POST'])
@@ -184,62 +972,38 @@ def generate_thumbnail():
 
     Expects multipart/form-data with:
     - file: PDF file
+    or a raw application/pdf body with an X-Filename header
 
     Returns:
     - image/png response body with the rendered thumbnail
     """
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-
-    if not file.filename.lower().endswith('.pdf'):
-        return jsonify({'error': 'Only PDF files are supported'}), 400
-
+    source = None
     try:
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_input:
-            file.save(tmp_input.name)
-            input_path = tmp_input.name
+        filename, source, error = load_upload()
+        if error:
+            return error
 
-        logger.info(f"Generating thumbnail for PDF: {file.filename}")
+        logger.info("Generating thumbnail for PDF: %s", filename)
 
-        import fitz  # PyMuPDF
+        png_bytes = run_in_pool(render_thumbnail, source)
 
-        doc = fitz.open(input_path)
-        page = doc.load_page(0)
+        logger.info("Successfully generated thumbnail for %s", filename)
 
-        zoom = 0.5
-        matrix = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=matrix, alpha=False)
+        return Response(png_bytes, mimetype='image/png')
 
-        doc.close()
-
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_output:
-            output_path = tmp_output.name
-            pix.save(output_path)
-
-        @after_this_request
-        def cleanup(response):
-            if os.path.exists(input_path):
-                os.unlink(input_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
-            return response
-
-        logger.info(f"Successfully generated thumbnail for {file.filename}")
-
-        return send_file(output_path, mimetype='image/png')
+    except ConversionTimeout:
+        return jsonify({'error': 'Conversion timed out'}), 504
 
     except Exception as e:
-        logger.error(f"Error generating thumbnail: {str(e)}")
-        if 'input_path' in locals() and os.path.exists(input_path):
-            os.unlink(input_path)
-        if 'output_path' in locals() and os.path.exists(output_path):
-            os.unlink(output_path)
+        logger.error("Error generating thumbnail: %s", e)
         return jsonify({'error': str(e)}), 500
 
+    finally:
+        discard_source(source)
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8180, debug=True)
+    # Local development only; Flask enables the reloader and debugger when
+    # FLASK_DEBUG=1 is set. The container serves the app with gunicorn (see
+    # gunicorn.conf.py).
+    app.run(host='0.0.0.0', port=8180)
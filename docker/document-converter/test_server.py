@@ -0,0 +1,194 @@
+"""
+Tests for the document converter's conversion timeouts and cache
+
+Run from this directory with: python -m unittest test_server
+"""
+
+import os
+import signal
+import sys
+import tempfile
+import time
+import unittest
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import fitz
+
+import server
+
+
+def hang(source):
+    """Stand-in for a conversion that never finishes"""
+    time.sleep(10)
+
+
+class ConversionTimeoutTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(server, CONVERSION_WORKERS=2, CONVERSION_TIMEOUT=2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Every test gets a pool sized for CONVERSION_WORKERS above
+        server._conversion_pool = None
+        self.addCleanup(self.shutdown_pool)
+        # Start the fork server up front so its import time isn't charged
+        # to the first task
+        server.run_in_pool(time.sleep, 0)
+
+    def shutdown_pool(self):
+        server.get_conversion_pool().shutdown()
+        server._conversion_pool = None
+
+    def test_result_and_errors_are_returned(self):
+        self.assertEqual(server.run_in_pool(divmod, 7, 2), (3, 1))
+        with self.assertRaises(ZeroDivisionError):
+            server.run_in_pool(divmod, 7, 0)
+
+    def test_crashed_process_reports_exit_code(self):
+        with self.assertRaisesRegex(RuntimeError, 'exited unexpectedly with code 3$'):
+            server.run_in_pool(os._exit, 3)
+        with self.assertRaisesRegex(RuntimeError, f'exited unexpectedly with code -{signal.SIGABRT}$'):
+            server.run_in_pool(os.abort)
+
+    def test_failed_start_closes_pipe(self):
+        receiver, sender = mock.Mock(), mock.Mock()
+        with mock.patch.object(server._process_context, 'Pipe', return_value=(receiver, sender)), \
+                mock.patch.object(server._process_context, 'Process') as process:
+            process.return_value.start.side_effect = OSError('fork failed')
+            process.return_value.pid = None
+            with self.assertRaises(OSError):
+                server.run_in_process(divmod, 7, 2)
+        receiver.close.assert_called_once_with()
+        sender.close.assert_called_once_with()
+
+    def test_queued_tasks_do_not_time_out(self):
+        # The third task waits ~1.5 seconds for a slot, so its wall time
+        # exceeds CONVERSION_TIMEOUT while its run time doesn't
+        futures = [server.submit_to_pool(time.sleep, 1.5) for _ in range(3)]
+        for future in futures:
+            self.assertIsNone(future.result())
+
+    def test_stuck_task_does_not_affect_others(self):
+        stuck = server.submit_to_pool(time.sleep, 10)
+        healthy = server.submit_to_pool(time.sleep, 1)
+        started = time.monotonic()
+        with self.assertRaises(server.ConversionTimeout):
+            stuck.result()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIsNone(healthy.result())
+        self.assertEqual(server.run_in_pool(divmod, 7, 2), (3, 1))
+
+    def test_concurrent_timeouts(self):
+        futures = [server.submit_to_pool(time.sleep, 10) for _ in range(2)]
+        for future in futures:
+            with self.assertRaises(server.ConversionTimeout):
+                future.result()
+        self.assertEqual(server.run_in_pool(divmod, 7, 2), (3, 1))
+
+    def post_pdf(self, path):
+        with fitz.open() as doc:
+            doc.new_page()
+            body = doc.tobytes()
+        headers = {
+            'X-API-Key': server.API_KEY,
+            'Content-Type': 'application/pdf',
+            'X-Filename': 'document.pdf',
+        }
+        return server.app.test_client().post(path, data=body, headers=headers)
+
+    def test_concurrent_timeouts_return_504(self):
+        def post(_):
+            return self.post_pdf('/generate-thumbnail?cache=0')
+
+        with mock.patch.object(server, 'render_thumbnail', hang), ThreadPoolExecutor(2) as requests:
+            responses = list(requests.map(post, range(2)))
+        for response in responses:
+            self.assertEqual(response.status_code, 504)
+            self.assertEqual(response.get_json(), {'error': 'Conversion timed out'})
+
+    def test_stream_page_count_timeout_returns_504(self):
+        with mock.patch.object(server, 'pdf_page_count', hang):
+            response = self.post_pdf('/convert-mupdf-stream?cache=0')
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.get_json(), {'error': 'Conversion timed out'})
+
+    def test_upload_timeout_is_not_a_conversion_timeout(self):
+        with mock.patch.object(server, 'save_upload', side_effect=TimeoutError('timed out')):
+            response = self.post_pdf('/convert-mupdf-stream')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json(), {'error': 'timed out'})
+
+
+class ConversionCacheTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.multiple(
+            server,
+            CACHE_DIR=cache_dir.name,
+            _memory_cache=OrderedDict(),
+            _memory_cache_bytes=0,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tee_to_cache_stores_complete_stream(self):
+        chunks = list(server.tee_to_cache('abc', '.md', iter(['# A\n', 'b\n'])))
+        self.assertEqual(chunks, ['# A\n', 'b\n'])
+        self.assertEqual(server.read_cached('abc', '.md'), '# A\nb\n')
+
+    def test_tee_to_cache_propagates_chunk_errors(self):
+        def failing_chunks():
+            yield '# A\n'
+            raise server.ConversionTimeout('Conversion task timed out after 2 seconds')
+
+        chunks = server.tee_to_cache('abc', '.md', failing_chunks())
+        self.assertEqual(next(chunks), '# A\n')
+        with self.assertRaises(server.ConversionTimeout):
+            next(chunks)
+        self.assertIsNone(server.read_cached('abc', '.md'))
+        self.assertEqual(os.listdir(server.CACHE_DIR), [])
+
+    def test_prune_cache_deletes_least_recently_used(self):
+        for digest in ['new', 'used', 'old']:
+            server.write_cached(digest, '.md', 'x' * 1000)
+        # The first read fills the memory cache, the second one hits it
+        server.read_cached('used', '.md')
+        for age, digest in enumerate(['new', 'old', 'used']):
+            os.utime(server.cache_path(digest, '.md'), (1000 - age, 1000 - age))
+        server.read_cached('used', '.md')
+
+        with mock.patch.object(server, 'CACHE_MAX_BYTES', 2000):
+            server.prune_cache()
+        self.assertEqual(sorted(os.listdir(server.CACHE_DIR)), ['new.md', 'used.md'])
+
+        stale_tmp = os.path.join(server.CACHE_DIR, 'abandoned.tmp')
+        open(stale_tmp, 'w').close()
+        os.utime(stale_tmp, (1000, 1000))
+        server.prune_cache()
+        self.assertFalse(os.path.exists(stale_tmp))
+
+    def test_memory_cache_is_bounded_by_size(self):
+        text = 'x' * 1000
+        limit = 2 * sys.getsizeof(text)
+        with mock.patch.object(server, 'MEMORY_CACHE_MAX_BYTES', limit):
+            for digest in ['a', 'b', 'c']:
+                server.write_cached(digest, '.md', text)
+                server.read_cached(digest, '.md')
+            server.remember_cached('huge.md', 'x' * limit)
+        self.assertEqual(list(server._memory_cache), ['b.md', 'c.md'])
+        self.assertLessEqual(server._memory_cache_bytes, limit)
+
+
+class ScratchDirTest(unittest.TestCase):
+    def test_files_that_do_not_fit_go_to_disk(self):
+        usage = mock.Mock(free=1000)
+        with mock.patch('shutil.disk_usage', return_value=usage):
+            self.assertEqual(server.scratch_dir_for(10), server.SCRATCH_DIR)
+            self.assertEqual(server.scratch_dir_for(1000), tempfile.gettempdir())
+            self.assertEqual(server.scratch_dir_for(None), tempfile.gettempdir())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -34,10 +34,8 @@ export async function pdfToMarkdownMupdf(
     // Read the PDF file
     const fileBuffer = await readFile(document.filePath);
 
-    // Create form data
-    const formData = new FormData();
+    // Send the PDF as raw request body (skips multipart parsing)
     const blob = new Blob([fileBuffer as any], { type: "application/pdf" });
-    formData.append("file", blob, "document.pdf");
 
     // Call document converter API with MuPDF endpoint
     const response = await fetch(
@@ -46,8 +44,10 @@ export async function pdfToMarkdownMupdf(
         method: "POST",
         headers: {
           "X-API-Key": DOCUMENT_CONVERTER_API_KEY,
+          "Content-Type": "application/pdf",
+          "X-Filename": "document.pdf",
         },
-        body: formData,
+        body: blob,
       },
     );
 
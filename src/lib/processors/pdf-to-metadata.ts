@@ -56,21 +56,21 @@ export async function pdfToMetadata(
     // Read the PDF file
     const fileBuffer = await readFile(document.filePath);
 
-    // Create form data
-    const formData = new FormData();
+    // Send the PDF as raw request body (skips multipart parsing)
     const blob = new Blob([fileBuffer as any], { type: "application/pdf" });
-    formData.append("file", blob, "document.pdf");
-    formData.append("fields", JSON.stringify([metadataField]));
+    const fields = encodeURIComponent(JSON.stringify([metadataField]));
 
     // Call document converter API metadata endpoint
     const response = await fetch(
-      `${DOCUMENT_CONVERTER_API_URL}/extract-metadata`,
+      `${DOCUMENT_CONVERTER_API_URL}/extract-metadata?fields=${fields}`,
       {
         method: "POST",
         headers: {
           "X-API-Key": DOCUMENT_CONVERTER_API_KEY,
+          "Content-Type": "application/pdf",
+          "X-Filename": "document.pdf",
         },
-        body: formData,
+        body: blob,
       },
     );
 
@@ -32,9 +32,7 @@ export async function pdfToThumbnailMupdf(
   try {
     const fileBuffer = await readFile(document.filePath);
 
-    const formData = new FormData();
     const blob = new Blob([fileBuffer as any], { type: "application/pdf" });
-    formData.append("file", blob, "document.pdf");
 
     const response = await fetch(
       `${DOCUMENT_CONVERTER_API_URL}/generate-thumbnail`,
@@ -42,8 +40,10 @@ export async function pdfToThumbnailMupdf(
         method: "POST",
         headers: {
           "X-API-Key": DOCUMENT_CONVERTER_API_KEY,
+          "Content-Type": "application/pdf",
+          "X-Filename": "document.pdf",
         },
-        body: formData,
+        body: blob,
       },
     );
 